@@ -1,19 +1,22 @@
-from pathlib import Path
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 import traceback
-import json
+import threading
+import time
 
 import logging
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
-import geopandas as gpd
-from scoring.point_model import analyze_walkability_at_location
-from scoring.area_model import analyze_walkability_by_neighborhood
-from scoring.utils import get_neighborhood_for_location
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+from typing import Literal
+# geopandas and the scoring modules are imported lazily (see get_state),
+# so the worker can start answering /ready while it warms up
+from scoring.state import load_city_index, load_scoring_state
+from responses import json_response, make_digest, not_modified
+from profiling import PROFILING_ENABLED, profile_request, report_path
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -38,6 +41,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # readable by the frontend, which replays the ETag as If-None-Match
+    expose_headers=["ETag", "X-Profile-Report"],
 )
 
 # --- Exception handlers (for debugging) ---
@@ -83,8 +88,121 @@ templates = Jinja2Templates(directory="frontend")
 # app.mount("/js", StaticFiles(directory=frontend_dir / "js"), name="js")
 # app.mount("/css", StaticFiles(directory=frontend_dir / "css"), name="css")
 
-# --- Load your dataset once ---
-pois_gdf = gpd.read_file("data/pois.geojson")
+# --- Load your dataset once (from the warm-start snapshot when it is fresh) ---
+POIS_PATH = "data/pois.geojson"
+RETRY_AFTER_S = 30  # after a failed load, fail fast for this long before retrying
+MAX_WARM_UP_DELAY_S = 300
+_ready = threading.Event()
+
+
+class LazyLoader:
+    """Build a value once on first use; after a failure, fail fast until the backoff expires."""
+
+    def __init__(self, name, loader, retry_after_s=RETRY_AFTER_S):
+        self.name = name
+        self._loader = loader
+        self.retry_after_s = retry_after_s
+        self._value = None
+        self._error = None
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._value is not None:
+                return self._value
+            if self._error is not None and time.monotonic() - self._failed_at < self.retry_after_s:
+                raise RuntimeError(f"{self.name} unavailable: {self._error}")
+            try:
+                self._value = self._loader()
+            except Exception as exc:
+                self._error, self._failed_at = exc, time.monotonic()
+                raise
+            self._error = None
+            return self._value
+
+
+# the scoring state serves /api/analyze; the ranking index is separate so a
+# failure there only affects /api/rank
+_state_loader = LazyLoader("Scoring state", lambda: load_scoring_state(POIS_PATH))
+_city_index_loader = LazyLoader("City index", lambda: load_city_index(get_state()))
+
+
+def get_state():
+    """Return the scoring state, loading it on first use."""
+    return _state_loader.get()
+
+
+def get_city_index():
+    """Return the citywide ranking index, loading it on first use."""
+    return _city_index_loader.get()
+
+
+def scoring_inputs(state, lat, lon, categories, thresholds):
+    """POIs (metric CRS), their category index and neighborhoods to score one location."""
+    if "tile_store" in state:
+        return state["tile_store"].local_data(lat, lon, radius_m=max(thresholds, default=0), categories=categories)
+    return {"pois_m": state["pois_m"], "poi_index": state["poi_index"], "neighborhoods": None}
+
+
+def warm_up_scoring():
+    """Load the state and run one synthetic query through the analyze hot paths."""
+    from scoring.point_model import analyze_walkability_at_location
+    from scoring.area_model import analyze_walkability_by_neighborhood
+    from scoring.utils import get_neighborhood_for_location
+
+    state = get_state()
+    if "tile_store" in state:
+        lat, lon = state["tile_store"].probe_location()
+    else:
+        probe = state["neighborhoods"].geometry.iloc[0].representative_point()
+        lat, lon = probe.y, probe.x
+    thresholds, weights = [500], [1]
+    inputs = scoring_inputs(state, lat, lon, [], thresholds)
+    categories = list(inputs["poi_index"])[:1]
+
+    analyze_walkability_at_location(
+        lat=lat, lon=lon, categories=categories,
+        thresholds=thresholds, weights=weights, pois=inputs["pois_m"],
+        poi_index=inputs["poi_index"],
+    )
+    neighborhood_name = get_neighborhood_for_location(lat, lon, inputs["neighborhoods"])
+    analyze_walkability_by_neighborhood(
+        neighborhood_name=neighborhood_name, pois=inputs["pois_m"],
+        categories=categories, thresholds=thresholds, weights=weights,
+        poi_index=inputs["poi_index"], neighborhoods=inputs["neighborhoods"],
+    )
+    return state, categories, thresholds, weights
+
+
+def warm_up():
+    """Warm the analyze paths (retrying with backoff), then the ranking index."""
+    from scoring.city_model import rank_neighborhoods
+
+    logger = logging.getLogger(__name__)
+    delay = RETRY_AFTER_S
+    while True:
+        try:
+            state, categories, thresholds, weights = warm_up_scoring()
+            break
+        except Exception:
+            logger.exception(f"Warm-up failed, worker stays not ready; retrying in {delay} s")
+            time.sleep(delay)
+            delay = min(2 * delay, MAX_WARM_UP_DELAY_S)
+    _ready.set()
+    logger.info("Warm-up complete, worker ready")
+
+    # ranking is optional for readiness: a failure only affects /api/rank
+    if "tile_store" not in state:
+        try:
+            rank_neighborhoods(get_city_index(), categories, thresholds, weights)
+        except Exception:
+            logger.exception("City index warm-up failed, /api/rank unavailable for now")
+
+
+@app.on_event("startup")
+def start_warm_up():
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
 # --- Define the structure of input data coming from frontend ---
 class Location(BaseModel):
@@ -98,6 +216,14 @@ class WalkabilityInput(BaseModel):
     thresholds: list
     weights: list
 
+class RankingInput(BaseModel):
+    categories: list
+    thresholds: list
+    weights: list
+    statistic: Literal["mean", "median", "percentile"] = "mean"
+    percentile: float = Field(75, ge=0, le=100)
+    top_k: int = Field(10, ge=0)
+
 # --- Routes ---
 
 # 1. Show your index page
@@ -114,25 +240,61 @@ def about():
     return templates.TemplateResponse("about.html", {"request": {}})
 
 
+# Readiness probe: 200 only once warm-up has exercised every hot path
+@app.get("/ready")
+def ready():
+    if not _ready.is_set():
+        return JSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True}
+
+
 # 2. Endpoint that runs your scoring logic
 @app.post("/api/analyze")
-def analyze_walkability_api(data: WalkabilityInput):
+def analyze_walkability_api(data: WalkabilityInput, request: Request):
+    # opt-in (WALKABILITY_PROFILING=1 + X-Profile header / ?profile=1)
+    with profile_request(request, "analyze") as report:
+        # a profiled request always recomputes instead of answering 304
+        response = run_analysis(data, request, allow_not_modified=report is None)
+    if report:
+        response.headers["X-Profile-Report"] = report["name"]
+    return response
+
+
+def run_analysis(data: WalkabilityInput, request: Request, allow_not_modified=True):
+    """Point score, neighborhood gradient and serialized response for one request."""
+    from scoring.point_model import analyze_walkability_at_location
+    from scoring.area_model import analyze_walkability_by_neighborhood
+    from scoring.utils import get_neighborhood_for_location
+
     print("received data: ", data)
+    state = get_state()
+    # same input + same dataset → same output, so answer repeats with 304
+    digest = make_digest(jsonable_encoder(data), state["data_hash"])
+    cached = not_modified(request, digest) if allow_not_modified else None
+    if cached is not None:
+        return cached
+
+    # POIs already in the metric CRS and indexed per category (STRtrees);
+    # with tiles, only the ones around this location are loaded
+    inputs = scoring_inputs(state, data.location.lat, data.location.lon, data.categories, data.thresholds)
     result_point = analyze_walkability_at_location(
         lat=data.location.lat,
         lon=data.location.lon,
         categories=data.categories,
         thresholds=data.thresholds,
         weights=data.weights,
-        pois=pois_gdf
+        pois=inputs["pois_m"],
+        poi_index=inputs["poi_index"],
     )
-    neighborhood_name = get_neighborhood_for_location(data.location.lat, data.location.lon)
+    neighborhood_name = get_neighborhood_for_location(data.location.lat, data.location.lon, inputs["neighborhoods"])
     gradient_layer = analyze_walkability_by_neighborhood(
         neighborhood_name=neighborhood_name,
-        pois=pois_gdf,
+        pois=inputs["pois_m"],
         categories=data.categories,
         thresholds=data.thresholds,
         weights=data.weights,
+        poi_index=inputs["poi_index"],
+        neighborhoods=inputs["neighborhoods"],
     )
     
     # --- build frontend JSON format ---
@@ -159,7 +321,42 @@ def analyze_walkability_api(data: WalkabilityInput):
         "gradient_layer": gradient_layer.__geo_interface__,  # optional: if you return gradient map too
     }
     #print("formatted output: ", formatted_output)
-    output_path = Path("sample_data.json")
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(formatted_output, f, indent=2)
-    return formatted_output
+    return json_response(request, formatted_output, digest)
+
+
+# 3. Citywide ranking of neighborhoods for a profile
+@app.post("/api/rank")
+def rank_neighborhoods_api(data: RankingInput, request: Request):
+    from scoring.city_model import rank_neighborhoods
+
+    state = get_state()
+    if "tile_store" in state:
+        return JSONResponse(status_code=501, content={"detail": "Citywide ranking is not available for tiled datasets"})
+    try:
+        city_index = get_city_index()
+    except Exception as exc:
+        return JSONResponse(status_code=503, content={"detail": str(exc)})
+    digest = make_digest(jsonable_encoder(data), state["data_hash"])
+    cached = not_modified(request, digest)
+    if cached is not None:
+        return cached
+
+    ranking = rank_neighborhoods(
+        city_index,
+        categories=data.categories,
+        thresholds=data.thresholds,
+        weights=data.weights,
+        statistic=data.statistic,
+        percentile=data.percentile,
+        top_k=data.top_k,
+    )
+    return json_response(request, ranking, digest)
+
+
+# 4. Stored profiling reports (only when profiling is enabled)
+@app.get("/api/profiles/{name}")
+def profile_report(name: str):
+    path = report_path(name) if PROFILING_ENABLED else None
+    if path is None:
+        return JSONResponse(status_code=404, content={"detail": "Profile report not found"})
+    return FileResponse(path)
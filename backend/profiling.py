@@ -0,0 +1,106 @@
+"""
+profiling.py — Opt-in profiling of single scoring requests.
+
+Disabled unless WALKABILITY_PROFILING=1. When enabled, a request sent with
+an `X-Profile: 1` header or `?profile=1` runs under pyinstrument (sampling,
+HTML call tree / flame view) when it is installed, or cProfile otherwise
+(.prof for snakeviz/flameprof plus a text summary). Reports are written to
+WALKABILITY_PROFILES_DIR and named in the `X-Profile-Report` header.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from fastapi import Request
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # fall back to the deterministic stdlib profiler
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.environ.get("WALKABILITY_PROFILING") == "1"
+PROFILES_DIR = Path(os.environ.get("WALKABILITY_PROFILES_DIR", "data/profiles"))
+TRUTHY = ("1", "true", "yes")
+
+
+def profiling_requested(request: Request):
+    """True if profiling is enabled and this request asks for it."""
+    if not PROFILING_ENABLED:
+        return False
+    flag = request.headers.get("x-profile") or request.query_params.get("profile") or ""
+    return flag.lower() in TRUTHY
+
+
+def report_path(name):
+    """Path of a stored report, or None if the name is not a plain report file."""
+    if Path(name).name != name:
+        return None
+    path = PROFILES_DIR / name
+    return path if path.is_file() else None
+
+
+def _save_pyinstrument(profiler, stem):
+    path = PROFILES_DIR / f"{stem}.html"
+    path.write_text(profiler.output_html(), encoding="utf-8")
+    return path
+
+
+def _save_cprofile(profiler, stem):
+    path = PROFILES_DIR / f"{stem}.prof"
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+    (PROFILES_DIR / f"{stem}.txt").write_text(summary.getvalue(), encoding="utf-8")
+    return path
+
+
+@contextmanager
+def profile_request(request: Request, label):
+    """
+    Profile the enclosed block if the request asks for it. Yields a dict that
+    gets the report file name once the block is done, or None when not profiling.
+    """
+    if not profiling_requested(request):
+        yield None
+        return
+
+    report = {}
+    profiler = Profiler() if Profiler is not None else cProfile.Profile()
+    try:
+        if Profiler is not None:
+            profiler.start()
+        else:
+            profiler.enable()
+    except (RuntimeError, ValueError):
+        # another request is already being profiled on this interpreter
+        logger.warning(f"Profiler busy, running {label} without profiling")
+        yield None
+        return
+
+    started = time.perf_counter()
+    try:
+        yield report
+    finally:
+        if Profiler is not None:
+            profiler.stop()
+        else:
+            profiler.disable()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}"
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        if Profiler is not None:
+            path = _save_pyinstrument(profiler, stem)
+        else:
+            path = _save_cprofile(profiler, stem)
+        report["name"] = path.name
+        logger.info(f"Profiled {label} in {elapsed_ms:.0f} ms → {path}")
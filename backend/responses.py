@@ -0,0 +1,114 @@
+"""
+responses.py — Cacheable, compressed JSON responses for the scoring API.
+
+Scoring results are a pure function of the request body and the dataset
+version, so a hash of both makes a stable ETag (suffixed with the content
+coding, since gzip/br/identity bodies differ byte for byte). Repeat
+requests carrying it in If-None-Match get a 304 without recomputing
+anything; other bodies are serialized with orjson and compressed with
+brotli or gzip when the client accepts it.
+"""
+
+import gzip
+import hashlib
+import json
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library serializer
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def make_digest(payload, data_hash):
+    """Digest of the normalized request payload and dataset hash."""
+    normalized = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{data_hash}:{normalized}".encode("utf-8")).hexdigest()[:32]
+
+
+def encoded_etag(digest, encoding):
+    """Strong ETag for one content coding of the response."""
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value covers the given ETag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _default(obj):
+    """Serialize numpy scalars left in GeoDataFrame properties."""
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Serialize content to JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def choose_encoding(accept_encoding):
+    """Pick 'br', 'gzip' or None from an Accept-Encoding header."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def not_modified(request: Request, digest):
+    """304 response if the client already holds this ETag, else None."""
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    etag = encoded_etag(digest, encoding)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+    return None
+
+
+def json_response(request: Request, content, digest):
+    """JSON response with ETag, compressed according to Accept-Encoding."""
+    body = dumps(content)
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    headers = {"ETag": encoded_etag(digest, encoding), "Vary": "Accept-Encoding"}
+
+    # always compress when negotiated, so the ETag suffix matches the bytes
+    if encoding:
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -7,56 +7,55 @@ then combines them into one overlay for gradient map visualization.
 
 import logging
 import geopandas as gpd
-from shapely.geometry import box
+import shapely
 import numpy as np
 
 from scoring.utils import (
+    build_poi_index,
     convert_to_geo_crs,
     convert_to_metric_crs,
-    linear_decay,
     load_neighborhoods,
+    nearest_distances,
     LOCAL_EPSG
 )
 
 logger = logging.getLogger(__name__)
 
 
-def calculate_distance_scores(pois_category_m, polygon_m, threshold, spacing_m=100):
+def build_grid_cells(area_m, spacing_m=100):
+    """Square cells (100m spacing) intersecting the neighborhood, and their centers."""
+    minx, miny, maxx, maxy = area_m.bounds
+    xs, ys = np.meshgrid(np.arange(minx, maxx, spacing_m), np.arange(miny, maxy, spacing_m))
+    xs, ys = xs.ravel(), ys.ravel()
+    cells = shapely.box(xs, ys, xs + spacing_m, ys + spacing_m)
+    cells = cells[shapely.intersects(cells, area_m)]
+    return cells, shapely.centroid(cells)
+
+
+def calculate_distance_scores(category_entry, cells, centers, threshold):
     """
     Create a vector layer of walkability scores within a neighborhood
-    for one category, using linear decay with distance from nearest POI.
+    for one category, using linear decay with distance from nearest POI
+    (nearest edge for park polygons and lines), measured for all cell
+    centers in one STRtree query.
     """
-    # Generate grid of square cells across the neighborhood (100m spacing)
-    minx, miny, maxx, maxy = polygon_m.total_bounds
-    xs = np.arange(minx, maxx, spacing_m)
-    ys = np.arange(miny, maxy, spacing_m)
-
-    cells = []
-    scores = []
-
-    for x in xs:
-        for y in ys:
-            # create square cell
-            cell = box(x, y, x + spacing_m, y + spacing_m)
-            if not cell.intersects(polygon_m.unary_union):
-                continue
-
-            # measure distance from the cell's center to the nearest POI
-            center_pt = cell.centroid
-            if pois_category_m.empty:
-                score = 0.0
-            else:
-                dist = pois_category_m.distance(center_pt).min()
-                score = linear_decay(dist, threshold)
-
-            cells.append(cell)
-            scores.append(score)
+    dist = nearest_distances(category_entry, centers)
+    scores = np.clip(1 - dist / threshold, 0, 1) if threshold > 0 else np.zeros(len(cells))
 
     # create GeoDataFrame of polygons with scores
     grid_gdf = gpd.GeoDataFrame({"score": scores, "geometry": cells}, crs=LOCAL_EPSG)
     return grid_gdf
 
 
+def clip_category_to_polygon(category_entry, area_m):
+    """Index entry restricted to the POIs touching the neighborhood polygon."""
+    if category_entry is None:
+        return None
+    hits = category_entry["tree"].query(area_m, predicate="intersects")
+    pois_clipped = category_entry["pois"].iloc[np.sort(hits)]
+    return {"pois": pois_clipped, "tree": shapely.STRtree(pois_clipped.geometry.values)}
+
+
 def combine_category_layers(category_layers, weights):
     """
     Overlay and combine all category score layers into one weighted layer.
@@ -82,8 +81,9 @@ def combine_category_layers(category_layers, weights):
     combined = combined[["geometry", "score"]]
     return combined
 
-def get_polygon_geometry(neighborhood_name):
-    neighborhoods = load_neighborhoods()
+def get_polygon_geometry(neighborhood_name, neighborhoods=None):
+    if neighborhoods is None:
+        neighborhoods = load_neighborhoods()
     polygon = neighborhoods[neighborhoods["NOM"] == neighborhood_name]
     if polygon.empty:
         logger.error(f"Neighborhood '{neighborhood_name}' not found")
@@ -91,29 +91,32 @@ def get_polygon_geometry(neighborhood_name):
     return convert_to_metric_crs(polygon)
     
 
-def analyze_walkability_by_neighborhood(neighborhood_name:str, pois:gpd.GeoDataFrame, categories:list, thresholds:list, weights:list):
+def analyze_walkability_by_neighborhood(neighborhood_name:str, pois:gpd.GeoDataFrame, categories:list, thresholds:list, weights:list, poi_index=None, neighborhoods=None):
     """
     Compute vector-based walkability score layer for a neighborhood polygon.
 
     Steps:
-      1. Clip POIs to the neighborhood.
+      1. Clip POIs (points, lines, polygons) to the neighborhood.
       2. For each category, compute a distance-decay score layer.
       3. Overlay and weight all layers into one composite layer.
       4. Convert back to EPSG:4326 for map rendering.
+
+    `poi_index` (see `build_poi_index`) can be passed to reuse prebuilt trees,
+    `neighborhoods` to look the polygon up in an already loaded subset (tiles).
     """
     logger.info(f"Analyzing neighborhood: {neighborhood_name}")
 
-    pois_m = convert_to_metric_crs(pois)
-    neighborhood_polygon = get_polygon_geometry(neighborhood_name)
-    # clip pois by neighborhood
-    pois_neighborhood = pois_m[pois_m.within(neighborhood_polygon.unary_union)]
+    if poi_index is None:
+        poi_index = build_poi_index(convert_to_metric_crs(pois))
+    neighborhood_area = get_polygon_geometry(neighborhood_name, neighborhoods).unary_union
+    cells, centers = build_grid_cells(neighborhood_area)
 
     # Build per-category layers
     category_layers = []
     for i, category in enumerate(categories):
         threshold = thresholds[i]
-        pois_category = pois_neighborhood[pois_neighborhood["category"] == category]
-        score_layer = calculate_distance_scores(pois_category, neighborhood_polygon, threshold)
+        category_entry = clip_category_to_polygon(poi_index.get(category), neighborhood_area)
+        score_layer = calculate_distance_scores(category_entry, cells, centers, threshold)
         category_layers.append(score_layer)
         logger.info(f"Built layer for '{category}' ({len(score_layer)} points)")
 
@@ -0,0 +1,157 @@
+"""
+city_model.py — Citywide neighborhood ranking.
+
+Precomputes, for every neighborhood, the same 100m grid and the same
+clipped POI distances the gradient map uses (see area_model), once for
+every category. Any categories/thresholds/weights profile is then scored
+for the whole city with vectorized numpy ops instead of one
+`analyze_walkability_by_neighborhood` call per neighborhood.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.errors import GEOSException
+
+from scoring.area_model import build_grid_cells, clip_category_to_polygon
+from scoring.utils import (
+    build_poi_index,
+    convert_to_metric_crs,
+    load_neighborhoods,
+    nearest_distances,
+    LOCAL_EPSG
+)
+
+logger = logging.getLogger(__name__)
+
+RANKING_STATISTICS = ("mean", "median", "percentile")
+
+
+def build_neighborhood_cells(polygons_m, poi_index, categories, spacing_m=100):
+    """
+    Grid cell centers of one neighborhood and, per category, their distance
+    to the nearest POI clipped to that neighborhood — as in the gradient map.
+    """
+    area_m = polygons_m.unary_union
+    _, centers = build_grid_cells(area_m, spacing_m)
+    distances = {
+        category: nearest_distances(clip_category_to_polygon(poi_index[category], area_m), centers)
+        for category in categories
+    }
+    return centers, distances
+
+
+def build_city_index(pois:gpd.GeoDataFrame, spacing_m=100, max_workers=None):
+    """
+    Precompute everything a citywide ranking needs:
+      1. Build the gradient grid of every neighborhood (cells touching it).
+      2. For each POI category, measure center → nearest POI distance against
+         the POIs clipped to that neighborhood (edge distance for parks/lines).
+         Neighborhoods run in parallel threads.
+      3. Keep geographic coordinates of the centers for the response.
+    """
+    neighborhoods_m = convert_to_metric_crs(load_neighborhoods())
+    poi_index = build_poi_index(convert_to_metric_crs(pois))
+    categories = sorted(poi_index)
+
+    def build_one(name):
+        # one bad polygon skips its neighborhood instead of the whole city
+        try:
+            polygons_m = neighborhoods_m[neighborhoods_m["NOM"] == name]
+            return build_neighborhood_cells(polygons_m, poi_index, categories, spacing_m)
+        except GEOSException as exc:
+            logger.warning(f"Skipping neighborhood '{name}' in city index: {exc}")
+            return None
+
+    names = list(dict.fromkeys(neighborhoods_m["NOM"]))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        built = list(executor.map(build_one, names))
+    names = [name for name, result in zip(names, built) if result is not None]
+    results = [result for result in built if result is not None]
+    if not results:
+        raise RuntimeError("No neighborhood could be added to the city index")
+
+    centers = np.concatenate([cell_centers for cell_centers, _ in results])
+    cell_names = np.concatenate([
+        np.full(len(cell_centers), name, dtype=object)
+        for name, (cell_centers, _) in zip(names, results)
+    ])
+    distances = {
+        category: np.concatenate([cell_distances[category] for _, cell_distances in results])
+        for category in categories
+    }
+
+    centers_geo = gpd.GeoSeries(centers, crs=LOCAL_EPSG).to_crs(epsg=4326)
+    city_index = {
+        "spacing_m": spacing_m,
+        "neighborhood": cell_names,
+        "lon": centers_geo.x.to_numpy(),
+        "lat": centers_geo.y.to_numpy(),
+        "distances": distances,
+    }
+    logger.info(f"City index built — {len(cell_names)} cells, {len(categories)} categories")
+    return city_index
+
+
+def score_city_cells(city_index, categories:list, thresholds:list, weights:list):
+    """Weighted linear-decay score (0–1) of every city cell for one profile."""
+    n_cells = len(city_index["neighborhood"])
+    score_sum = np.zeros(n_cells)
+    total_w = 0.0
+    for category, threshold, weight in zip(categories, thresholds, weights):
+        w = float(weight)
+        total_w += w
+        dist = city_index["distances"].get(category)
+        if w <= 0 or dist is None or threshold <= 0:
+            continue
+        score_sum += w * np.clip(1 - dist / threshold, 0, 1)
+
+    if not total_w:
+        return np.zeros(n_cells)
+    return score_sum / total_w
+
+
+def rank_neighborhoods(city_index, categories:list, thresholds:list, weights:list,
+                       statistic="mean", percentile=75, top_k=10):
+    """
+    Rank all neighborhoods for a profile and list the best cells citywide.
+
+    Neighborhood scores are the mean, median or given percentile of their
+    cell scores, on the same 0–100 scale as the walkability index.
+    """
+    if statistic not in RANKING_STATISTICS:
+        raise ValueError(f"Unknown ranking statistic '{statistic}'")
+
+    scores = score_city_cells(city_index, categories, thresholds, weights)
+    grouped = pd.Series(scores).groupby(city_index["neighborhood"])
+    if statistic == "mean":
+        by_neighborhood = grouped.mean()
+    elif statistic == "median":
+        by_neighborhood = grouped.median()
+    else:
+        by_neighborhood = grouped.quantile(percentile / 100)
+    by_neighborhood = by_neighborhood.sort_values(ascending=False)
+
+    rankings = [
+        {"rank": rank, "neighborhood": name, "score": round(100 * float(score), 1)}
+        for rank, (name, score) in enumerate(by_neighborhood.items(), start=1)
+    ]
+
+    top_k = max(0, min(int(top_k), len(scores)))
+    top_idx = np.argpartition(-scores, top_k - 1)[:top_k] if top_k else np.array([], dtype=int)
+    top_idx = top_idx[np.argsort(-scores[top_idx])]
+    top_cells = [
+        {
+            "lat": float(city_index["lat"][i]),
+            "lon": float(city_index["lon"][i]),
+            "neighborhood": city_index["neighborhood"][i],
+            "score": round(100 * float(scores[i]), 1),
+        }
+        for i in top_idx
+    ]
+
+    logger.info(f"Ranked {len(rankings)} neighborhoods by {statistic}")
+    return {"rankings": rankings, "top_cells": top_cells}
@@ -4,9 +4,13 @@
 
 import logging
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
 from shapely.geometry import Point
 
 from scoring.utils import (
+    build_poi_index,
     convert_to_geo_crs,
     convert_to_metric_crs,
     linear_decay,
@@ -38,15 +42,24 @@ def combine_scores(scores, weights):
     logger.info(f"Combined index={index}")
     return index
 
-def get_nearby_pois(pois_with_dist: gpd.GeoDataFrame, category: str, threshold: float):
-    """Return list of POIs in geo crs within threshold meters of user_point."""
+def get_nearby_pois(pois_with_dist: gpd.GeoDataFrame, category: str, threshold: float, user_point_m: Point):
+    """
+    Return list of POIs in geo crs within threshold meters of user_point.
+    Each POI is one marker point: the point itself, or for parks and lines
+    the nearest point of their edge, so the map gets a Point for every POI.
+    """
     nearby_pois_m = pois_with_dist[
         (pois_with_dist["category"] == category)
         & (pois_with_dist["distance"] <= threshold)
     ]
     if nearby_pois_m.empty:
         return []
-    nearby_pois = convert_to_geo_crs(nearby_pois_m)
+    markers = gpd.GeoSeries(
+        shapely.get_point(shapely.shortest_line(nearby_pois_m.geometry.values, user_point_m), 0),
+        index=nearby_pois_m.index,
+        crs=nearby_pois_m.crs,
+    )
+    nearby_pois = convert_to_geo_crs(nearby_pois_m.set_geometry(markers))
     nearby_pois_list = []
     for _, row in nearby_pois.iterrows():
         nearby_pois_list.append({
@@ -74,7 +87,35 @@ def find_nearest_pois(pois_with_dist: gpd.GeoDataFrame, categories: list):
     return nearest_pois_names, nearest_pois_distances
 
 
-def analyze_walkability_at_location(lat:float, lon:float, categories:list, thresholds:list, weights:list, pois:gpd.GeoDataFrame):
+def measure_candidate_pois(poi_index, user_point_m, categories:list, thresholds:list):
+    """
+    Return the POIs that can matter for this point — the nearest one of each
+    category plus every one within its threshold — with a 'distance' column
+    (meters, nearest edge for lines/polygons). Found with STRtree queries
+    instead of measuring the distance to every POI.
+    """
+    max_thresholds = {}
+    for category, threshold in zip(categories, thresholds):
+        max_thresholds[category] = max(threshold, max_thresholds.get(category, threshold))
+
+    candidates = []
+    for category, threshold in max_thresholds.items():
+        entry = poi_index.get(category)
+        if entry is None or entry["pois"].empty:
+            continue
+        nearest_idx = entry["tree"].query_nearest(user_point_m, all_matches=False)
+        nearby_idx = entry["tree"].query(user_point_m, predicate="dwithin", distance=threshold)
+        idx = np.union1d(nearest_idx, nearby_idx).astype(int)
+        candidates.append(entry["pois"].iloc[idx])
+
+    if not candidates:
+        return gpd.GeoDataFrame(columns=["category", "distance", "geometry"])
+    pois_with_dist = gpd.GeoDataFrame(pd.concat(candidates), crs=candidates[0].crs)
+    pois_with_dist["distance"] = pois_with_dist.distance(user_point_m)
+    return pois_with_dist
+
+
+def analyze_walkability_at_location(lat:float, lon:float, categories:list, thresholds:list, weights:list, pois:gpd.GeoDataFrame, poi_index=None):
     """Compute walkability index for a given location.
       1. Calculates category scores (linear decay).
       2. Finds nearby POIs for each category: 
@@ -82,14 +123,17 @@ def analyze_walkability_at_location(lat:float, lon:float, categories:list, thres
         and number of pois within the buffer.
       3. Calculates walkability score
       4. Returns parallel lists for all metrics
+
+    `poi_index` (see `build_poi_index`) can be passed to reuse prebuilt trees.
     """
     logger.info(f"Analyzing walkability for lat={lat}, lon={lon}")
     user_point = Point(lon, lat)
     
-    # Adds one 'distance' column (meters) to POI dataset for this user point
-    pois_m = convert_to_metric_crs(pois.copy())
+    # Distance column (meters) only for the POIs that can affect the result
+    if poi_index is None:
+        poi_index = build_poi_index(convert_to_metric_crs(pois))
     user_point_m = convert_to_metric_crs(user_point)
-    pois_m["distance"] = pois_m.distance(user_point_m)
+    pois_m = measure_candidate_pois(poi_index, user_point_m, categories, thresholds)
     
     category_scores = []
     nearest_pois_names = []
@@ -108,7 +152,7 @@ def analyze_walkability_at_location(lat:float, lon:float, categories:list, thres
             continue
 
         score = calculate_category_score(pois_m, category, threshold)
-        nearby_pois = get_nearby_pois(pois_m, category, threshold)
+        nearby_pois = get_nearby_pois(pois_m, category, threshold, user_point_m)
         
         category_scores.append(score)
         nearby_pois_counts.append(len(nearby_pois))
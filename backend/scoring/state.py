@@ -0,0 +1,189 @@
+"""
+state.py — Warm-start snapshot of the in-memory scoring state.
+
+Builds everything the API needs from the source GeoJSON files once
+(metric POIs, neighborhood polygons) and pickles it next to the data.
+Later workers load it back with a single memory-mapped read, as long as
+the source files still hash the same. The citywide ranking index has its
+own snapshot and is loaded separately, so a ranking failure never blocks
+/api/analyze.
+
+geopandas and the scoring modules are imported only when a state has
+to be built, so importing this module stays cheap.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 3  # bump when the layout of the state dict changes
+SNAPSHOT_PATH = Path("data/scoring_state.pkl")
+CITY_INDEX_PATH = Path("data/city_index.pkl")
+# region-scale datasets are served from tiles instead (see scoring/tiles.py)
+TILES_DIR = Path(os.environ.get("WALKABILITY_TILES_DIR", "data/tiles"))
+TILE_CACHE_MB = int(os.environ.get("WALKABILITY_TILE_CACHE_MB", "256"))
+HASH_LENGTH = 64  # hex sha256 stored in front of the pickle
+# rebuilt after every load instead of pickled (STRtrees are cheap to build)
+RUNTIME_KEYS = ("poi_index",)
+
+
+def source_hash(paths):
+    """sha256 over the bytes of every source file (the dataset version)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_key(data_hash):
+    """Snapshot header: the dataset version combined with the state layout version."""
+    return hashlib.sha256(f"snapshot-v{SNAPSHOT_VERSION}:{data_hash}".encode()).hexdigest()
+
+
+def build_scoring_state(pois_path, data_hash):
+    """Parse the source files and build every derived structure."""
+    import geopandas as gpd
+    from scoring.utils import convert_to_metric_crs, load_neighborhoods
+
+    pois = gpd.read_file(pois_path)
+    state = {
+        "data_hash": data_hash,
+        "pois_m": convert_to_metric_crs(pois),
+        "neighborhoods": load_neighborhoods(),
+    }
+    logger.info(f"Scoring state built from {pois_path} ({len(pois)} POIs)")
+    return state
+
+
+def save_snapshot(state, path=SNAPSHOT_PATH):
+    """Write hash header + pickled state, replacing the old file atomically."""
+    path = Path(path)
+    # unique temp file per writer: workers starting together must not share one
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(snapshot_key(state["data_hash"]).encode("ascii"))
+            snapshot = {key: value for key, value in state.items() if key not in RUNTIME_KEYS}
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f"Scoring snapshot saved to {path}")
+
+
+def load_snapshot(path, data_hash):
+    """Return the snapshot state, or None if it is missing or stale."""
+    path = Path(path)
+    if not path.exists() or path.stat().st_size <= HASH_LENGTH:
+        return None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:HASH_LENGTH].decode("ascii", errors="replace") != snapshot_key(data_hash):
+            logger.info(f"Scoring snapshot {path} is stale, rebuilding")
+            return None
+        view = memoryview(mm)
+        try:
+            state = pickle.loads(view[HASH_LENGTH:])
+        finally:
+            view.release()
+    logger.info(f"Scoring snapshot loaded from {path}")
+    return state
+
+
+def tiles_match_sources(tiles_dir, source_paths):
+    """
+    True if the tile manifest was built by this code version from these
+    source files. Logs why not otherwise; trusts the tiles (with a warning)
+    when the sources are not deployed next to them.
+    """
+    from scoring.tiles import MANIFEST_NAME, TILES_VERSION
+
+    with open(Path(tiles_dir) / MANIFEST_NAME, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != TILES_VERSION:
+        logger.error(f"Tiles in {tiles_dir} have version {manifest.get('version')}, "
+                     f"expected {TILES_VERSION}; rebuild them with scripts.build_tiles")
+        return False
+    if not all(Path(path).exists() for path in source_paths):
+        logger.warning(f"Source files missing, serving tiles in {tiles_dir} unverified")
+        return True
+    if manifest.get("data_hash") != source_hash(source_paths):
+        logger.error(f"Tiles in {tiles_dir} are stale (source data changed); "
+                     f"rebuild them with scripts.build_tiles")
+        return False
+    return True
+
+
+def load_tiled_state(tiles_dir=TILES_DIR):
+    """State backed by a TileStore: nothing but the manifest is read up front."""
+    from scoring.tiles import TileStore
+
+    store = TileStore(tiles_dir, cache_budget_mb=TILE_CACHE_MB)
+    logger.info(f"Serving tiles from {tiles_dir} ({len(store.manifest['tiles'])} tiles)")
+    return {"data_hash": store.data_hash, "tile_store": store}
+
+
+def load_scoring_state(pois_path, snapshot_path=SNAPSHOT_PATH):
+    """
+    Load the scoring state from its snapshot, rebuilding it if the data changed.
+    If a tile manifest exists and matches the source files, serve from tiles instead.
+    """
+    from scoring.utils import NEIGHBORHOODS_PATH, build_poi_index, set_neighborhoods
+
+    source_paths = [pois_path, NEIGHBORHOODS_PATH]
+    from scoring.tiles import MANIFEST_NAME
+
+    if (TILES_DIR / MANIFEST_NAME).exists():
+        if tiles_match_sources(TILES_DIR, source_paths):
+            return load_tiled_state()
+        logger.warning("Falling back to the in-memory snapshot")
+
+    data_hash = source_hash(source_paths)
+    try:
+        state = load_snapshot(snapshot_path, data_hash)
+    except Exception:
+        logger.exception(f"Could not read scoring snapshot {snapshot_path}, rebuilding")
+        state = None
+
+    if state is None:
+        state = build_scoring_state(pois_path, data_hash)
+        try:
+            save_snapshot(state, snapshot_path)
+        except OSError:
+            logger.exception(f"Could not write scoring snapshot {snapshot_path}")
+
+    set_neighborhoods(state["neighborhoods"])
+    state["poi_index"] = build_poi_index(state["pois_m"])
+    return state
+
+
+def load_city_index(state, snapshot_path=CITY_INDEX_PATH):
+    """
+    Citywide ranking index for an in-memory state, from its own snapshot
+    when it matches the dataset, otherwise built and saved.
+    """
+    from scoring.city_model import build_city_index
+
+    try:
+        cached = load_snapshot(snapshot_path, state["data_hash"])
+    except Exception:
+        logger.exception(f"Could not read city index snapshot {snapshot_path}, rebuilding")
+        cached = None
+    if cached is not None:
+        return cached["city_index"]
+
+    city_index = build_city_index(state["pois_m"])
+    try:
+        save_snapshot({"data_hash": state["data_hash"], "city_index": city_index}, snapshot_path)
+    except OSError:
+        logger.exception(f"Could not write city index snapshot {snapshot_path}")
+    return city_index
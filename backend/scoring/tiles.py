@@ -0,0 +1,234 @@
+"""
+tiles.py — Fixed-size spatial tiles of POIs and neighborhoods on disk.
+
+For region-scale data (whole CMM, other cities) the POI and neighborhood
+files are split into square tiles in the metric CRS. A request only loads
+the tiles within its largest threshold of the query point, plus the tiles
+covering its neighborhood, through an LRU cache with a memory budget.
+
+Build the tiles once with `python -m scripts.build_tiles` from backend/.
+"""
+
+import json
+import logging
+import math
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import Point
+
+from scoring.utils import (
+    build_poi_index,
+    convert_to_metric_crs,
+    LOCAL_EPSG
+)
+
+logger = logging.getLogger(__name__)
+
+TILES_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+DEFAULT_TILE_SIZE_M = 5000
+DEFAULT_CACHE_BUDGET_MB = 256
+MAX_NEAREST_SEARCH_M = 50000  # hard cap when widening the search for a nearest POI
+
+
+def tile_key(ix, iy):
+    return f"{ix}_{iy}"
+
+
+def tile_keys_for_bounds(bounds, tile_size_m):
+    """Keys of every tile overlapped by (minx, miny, maxx, maxy) in meters."""
+    minx, miny, maxx, maxy = bounds
+    return [
+        tile_key(ix, iy)
+        for ix in range(math.floor(minx / tile_size_m), math.floor(maxx / tile_size_m) + 1)
+        for iy in range(math.floor(miny / tile_size_m), math.floor(maxy / tile_size_m) + 1)
+    ]
+
+
+def assign_to_tiles(gdf_m, tile_size_m):
+    """Map tile key → row positions of the features whose bounds overlap it."""
+    rows_by_tile = {}
+    for pos, bounds in enumerate(gdf_m.geometry.bounds.itertuples(index=False)):
+        for key in tile_keys_for_bounds(bounds, tile_size_m):
+            rows_by_tile.setdefault(key, []).append(pos)
+    return rows_by_tile
+
+
+def build_tiles(pois_path, neighborhoods_path, out_dir, tile_size_m=DEFAULT_TILE_SIZE_M):
+    """
+    Split POIs (metric CRS) and neighborhoods (EPSG:4326) into tile files.
+    Lines and polygons spanning several tiles are stored in each of them and
+    deduplicated on load through their 'poi_id'.
+    """
+    from scoring.state import source_hash
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    pois_m = convert_to_metric_crs(gpd.read_file(pois_path)).reset_index(drop=True)
+    pois_m["poi_id"] = pois_m.index
+    neighborhoods = gpd.read_file(neighborhoods_path).to_crs(epsg=4326)
+    neighborhoods["geometry"] = neighborhoods.geometry.make_valid()
+    neighborhoods_m = convert_to_metric_crs(neighborhoods)
+
+    poi_rows = assign_to_tiles(pois_m, tile_size_m)
+    neighborhood_rows = assign_to_tiles(neighborhoods_m, tile_size_m)
+
+    manifest = {
+        "version": TILES_VERSION,
+        "data_hash": source_hash([pois_path, neighborhoods_path]),
+        "tile_size_m": tile_size_m,
+        "categories": {str(category): int(count) for category, count in pois_m["category"].value_counts().items()},
+        "tiles": {},
+        "neighborhoods": {},
+    }
+    for key in sorted(set(poi_rows) | set(neighborhood_rows)):
+        tile = {
+            "pois": pois_m.iloc[poi_rows.get(key, [])],
+            "neighborhoods": neighborhoods.iloc[neighborhood_rows.get(key, [])],
+        }
+        path = out_dir / f"{key}.pkl"
+        with open(path, "wb") as f:
+            pickle.dump(tile, f, protocol=pickle.HIGHEST_PROTOCOL)
+        manifest["tiles"][key] = {
+            "bytes": path.stat().st_size,
+            "pois": len(tile["pois"]),
+            # lets the nearest-POI search skip tiles without a missing category
+            "categories": {str(category): int(count) for category, count in tile["pois"]["category"].value_counts().items()},
+        }
+        for name in tile["neighborhoods"]["NOM"]:
+            manifest["neighborhoods"].setdefault(name, []).append(key)
+
+    with open(out_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    logger.info(f"Wrote {len(manifest['tiles'])} tiles of {tile_size_m} m to {out_dir}")
+    return manifest
+
+
+class TileStore:
+    """Lazy, LRU-cached access to the tiles listed in a manifest."""
+
+    def __init__(self, tiles_dir, cache_budget_mb=DEFAULT_CACHE_BUDGET_MB):
+        self.tiles_dir = Path(tiles_dir)
+        with open(self.tiles_dir / MANIFEST_NAME, encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.tile_size_m = self.manifest["tile_size_m"]
+        self.data_hash = self.manifest["data_hash"]
+        # budget is counted in on-disk tile bytes, a stable proxy for memory
+        self.cache_budget = cache_budget_mb * 1024 * 1024
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+    def load_tile(self, key):
+        """Tile dict from the cache, reading it from disk on a miss."""
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        with open(self.tiles_dir / f"{key}.pkl", "rb") as f:
+            tile = pickle.load(f)
+
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = tile
+                self._cache_bytes += self.manifest["tiles"][key]["bytes"]
+                # always keep the newest tile, even if it alone exceeds the budget
+                while self._cache_bytes > self.cache_budget and len(self._cache) > 1:
+                    old_key, _ = self._cache.popitem(last=False)
+                    self._cache_bytes -= self.manifest["tiles"][old_key]["bytes"]
+            return self._cache[key]
+
+    def load_tiles(self, keys):
+        keys = [key for key in dict.fromkeys(keys) if key in self.manifest["tiles"]]
+        return [self.load_tile(key) for key in keys]
+
+    def neighborhood_keys(self, name):
+        return self.manifest["neighborhoods"].get(name, [])
+
+    def probe_location(self):
+        """(lat, lon) inside the first neighborhood of the manifest, for warm-up."""
+        name = next(iter(self.manifest["neighborhoods"]))
+        neighborhoods = self.load_tile(self.neighborhood_keys(name)[0])["neighborhoods"]
+        point = neighborhoods[neighborhoods["NOM"] == name].geometry.iloc[0].representative_point()
+        return point.y, point.x
+
+    def local_data(self, lat, lon, radius_m, categories=()):
+        """
+        POIs (metric CRS, with their category index) and neighborhoods needed
+        to score one location: tiles within `radius_m` of the point plus the
+        tiles covering the neighborhood that contains it.
+
+        The nearest POI of a category may lie further out, so for every
+        requested category without a POI inside the searched radius the
+        search ring keeps doubling up to MAX_NEAREST_SEARCH_M, matching what
+        the in-memory mode reports. Only ring tiles that contain such a
+        category are loaded, and categories absent from the whole dataset
+        never widen the search.
+        """
+        user_point = Point(lon, lat)
+        user_point_m = convert_to_metric_crs(user_point)
+        x, y = user_point_m.coords[0]
+        keys = tile_keys_for_bounds((x - radius_m, y - radius_m, x + radius_m, y + radius_m), self.tile_size_m)
+
+        home_tile = self.load_tiles([tile_key(math.floor(x / self.tile_size_m), math.floor(y / self.tile_size_m))])
+        neighborhoods = home_tile[0]["neighborhoods"] if home_tile else gpd.GeoDataFrame(columns=["NOM", "geometry"], crs=4326)
+        neighborhoods = neighborhoods[neighborhoods.contains(user_point)]
+        for name in neighborhoods["NOM"]:
+            keys.extend(self.neighborhood_keys(name))
+
+        tiles = self.load_tiles(keys)
+        seen_keys = set(keys)
+        n_loaded = len(tiles)
+        parts = [tile["pois"] for tile in tiles]
+
+        # a POI found within the searched radius is the true nearest one
+        search_m = radius_m
+        known = [category for category in categories if category in self.manifest["categories"]]
+        missing = self._categories_beyond(parts, user_point_m, known, search_m)
+        while missing and search_m < MAX_NEAREST_SEARCH_M:
+            search_m = min(max(2 * search_m, self.tile_size_m), MAX_NEAREST_SEARCH_M)
+            ring_keys = [
+                key for key in tile_keys_for_bounds((x - search_m, y - search_m, x + search_m, y + search_m), self.tile_size_m)
+                if key not in seen_keys
+            ]
+            seen_keys.update(ring_keys)
+            ring_keys = [key for key in ring_keys if self._has_any_category(key, missing)]
+            for tile in self.load_tiles(ring_keys):
+                parts.append(tile["pois"][tile["pois"]["category"].isin(missing)])
+                n_loaded += 1
+            missing = self._categories_beyond(parts, user_point_m, missing, search_m)
+
+        if parts:
+            pois_m = gpd.GeoDataFrame(pd.concat(parts), crs=LOCAL_EPSG).drop_duplicates(subset="poi_id")
+        else:
+            pois_m = gpd.GeoDataFrame(columns=["category", "poi_id", "geometry"], crs=LOCAL_EPSG)
+
+        logger.info(f"Loaded {n_loaded} tiles ({len(pois_m)} POIs) for lat={lat}, lon={lon}")
+        return {
+            "pois_m": pois_m,
+            "poi_index": build_poi_index(pois_m),
+            "neighborhoods": neighborhoods,
+        }
+
+    def _has_any_category(self, key, categories):
+        tile = self.manifest["tiles"].get(key)
+        return tile is not None and any(category in tile["categories"] for category in categories)
+
+    @staticmethod
+    def _categories_beyond(parts, user_point_m, categories, search_m):
+        """Requested categories whose nearest loaded POI is further than search_m (or absent)."""
+        missing = []
+        for category in dict.fromkeys(categories):
+            subsets = [part[part["category"] == category] for part in parts]
+            subsets = [subset for subset in subsets if not subset.empty]
+            nearest = min((subset.distance(user_point_m).min() for subset in subsets), default=math.inf)
+            if nearest > search_m:
+                missing.append(category)
+        return missing
@@ -1,10 +1,17 @@
 import logging
+from pathlib import Path
 import geopandas as gpd
+import numpy as np
+import shapely
 from shapely.geometry import Point
 
 logger = logging.getLogger(__name__)
 
 LOCAL_EPSG = 32188  # NAD83 / MTM zone 8 (Montréal)
+NEIGHBORHOODS_PATH = Path("data/processed/quartierreferencehabitation.geojson")
+
+# neighborhoods are read once per process (or restored from a snapshot)
+_neighborhoods = None
 
 def convert_to_metric_crs(data):
     """Convert a GeoDataFrame or Point to metric CRS (EPSG:32188)."""
@@ -18,6 +25,37 @@ def convert_to_geo_crs(gdf):
     return gdf.to_crs(epsg=4326)
 
 
+def build_poi_index(pois_m):
+    """
+    Split metric POIs by category, each with an STRtree over its geometries.
+    Works for points, lines and polygons alike (parks, greenways, ...).
+    """
+    poi_index = {}
+    for category, subset in pois_m.groupby("category"):
+        poi_index[category] = {
+            "pois": subset,
+            "tree": shapely.STRtree(subset.geometry.values),
+        }
+    return poi_index
+
+
+def nearest_distances(entry, points):
+    """
+    Distance (meters) from each point to the nearest POI of one category index
+    entry, in one bulk STRtree query. Lines and polygons are measured to their
+    nearest edge (0 inside a polygon). np.inf when the category has no POIs.
+    """
+    points = np.atleast_1d(points)
+    distances = np.full(len(points), np.inf)
+    if entry is None or entry["pois"].empty or len(points) == 0:
+        return distances
+    (input_idx, _), dists = entry["tree"].query_nearest(
+        points, return_distance=True, all_matches=False
+    )
+    distances[input_idx] = dists
+    return distances
+
+
 def linear_decay(distance, threshold):
     """Linear 0–1 score: 1 at distance=0, 0 at distance≥threshold."""
     if distance is None:
@@ -26,9 +64,10 @@ def linear_decay(distance, threshold):
         return 0.0
     return 1 - (distance / threshold)
 
-def get_neighborhood_for_location(lat, lon):
+def get_neighborhood_for_location(lat, lon, neighborhoods=None):
     user_point = Point(lon, lat)
-    neighborhoods = load_neighborhoods()
+    if neighborhoods is None:
+        neighborhoods = load_neighborhoods()
     neighborhood_row = neighborhoods[neighborhoods.contains(user_point)]
 
     if not neighborhood_row.empty:
@@ -38,9 +77,22 @@ def get_neighborhood_for_location(lat, lon):
         return "Unknown"
 
 def load_neighborhoods():
-    """Load neighborhood polygons for Montréal from GeoJSON."""
-    path = "data\processed\quartierreferencehabitation.geojson"
-    neighborhoods = gpd.read_file(path)
-    if neighborhoods.crs is None or neighborhoods.crs.to_epsg() != 4326:
-        neighborhoods = neighborhoods.to_crs(epsg=4326)
-    return neighborhoods
+    """Load neighborhood polygons for Montréal from GeoJSON (cached)."""
+    global _neighborhoods
+    if _neighborhoods is None:
+        neighborhoods = gpd.read_file(NEIGHBORHOODS_PATH)
+        if neighborhoods.crs is None or neighborhoods.crs.to_epsg() != 4326:
+            neighborhoods = neighborhoods.to_crs(epsg=4326)
+        # a few shipped polygons are invalid (e.g. Dorval) and break unions
+        invalid = ~neighborhoods.geometry.is_valid
+        if invalid.any():
+            logger.warning(f"Repairing {int(invalid.sum())} invalid neighborhood polygons")
+            neighborhoods["geometry"] = neighborhoods.geometry.make_valid()
+        _neighborhoods = neighborhoods
+    return _neighborhoods
+
+
+def set_neighborhoods(neighborhoods):
+    """Install already-loaded neighborhood polygons (e.g. from a snapshot)."""
+    global _neighborhoods
+    _neighborhoods = neighborhoods
@@ -0,0 +1,18 @@
+# Split POIs and neighborhoods into spatial tiles for region-scale data.
+# Run from backend/:  python -m scripts.build_tiles
+# Once data/tiles/manifest.json exists, the API serves from the tiles
+# (override the folder with WALKABILITY_TILES_DIR).
+import logging
+
+from scoring.state import TILES_DIR
+from scoring.tiles import build_tiles, DEFAULT_TILE_SIZE_M
+from scoring.utils import NEIGHBORHOODS_PATH
+
+logging.basicConfig(level=logging.INFO)
+
+build_tiles(
+    pois_path="data/pois.geojson",
+    neighborhoods_path=NEIGHBORHOODS_PATH,
+    out_dir=TILES_DIR,
+    tile_size_m=DEFAULT_TILE_SIZE_M,
+)